@@ -1,25 +1,33 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Any, Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
 import pandas as pd
 import numpy as np
 import joblib
 from pathlib import Path
 from datetime import datetime
 import json
+import orjson
 
-from .database import Database
+from .database import Database, PoolTimeout
+from .email_service import EmailService
 from .model_monitor import ModelMonitor
 from .config_manager import ConfigManager
+from .inference import fuse_projection, centroid_table, nearest_centroid
 from .logging_config import logger
 
 # Initialize components
-app = FastAPI(title="Customer Segmentation API")
+app = FastAPI(title="Customer Segmentation API", default_response_class=ORJSONResponse)
 db = Database()
-monitor = ModelMonitor()
-config_manager = ConfigManager()
+config_manager = ConfigManager.get()
 api_config = config_manager.get_config('api')
+email_service = EmailService(config_manager.get_config('email'))
+monitor = ModelMonitor(config_manager.get_config('monitor'), email_service)
 
 # CORS middleware
 app.add_middleware(
@@ -33,6 +41,128 @@ app.add_middleware(
 # API key security
 api_key_header = APIKeyHeader(name=api_config.get('api_key_header', 'X-API-Key'))
 
+# Model artifacts, loaded once at startup and keyed by model type
+MODELS: Dict[str, Dict[str, Any]] = {}
+AVAILABLE_MODELS: List[str] = []
+
+# Reference customer data for drift checks, parsed once at startup
+REFERENCE_DATA: Optional[pd.DataFrame] = None
+
+# Worker threads for CPU-bound inference, kept off the event loop
+EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+# Micro-batching of concurrent predict requests, one queue per model type
+MAX_BATCH_ROWS = 256
+MAX_BATCH_WAIT_MS = 5
+BATCH_QUEUES: Dict[str, asyncio.Queue] = {}
+_batch_tasks: List[asyncio.Task] = []
+# Dispatched batches, kept referenced until they finish
+_inflight_batches: Set[asyncio.Task] = set()
+
+@app.on_event("startup")
+async def load_models():
+    """Load model artifacts into memory once per process."""
+    try:
+        artifacts = joblib.load(Path("models") / "models.joblib")
+    except Exception as e:
+        logger.error(f"Error loading model artifacts: {str(e)}", exc_info=True)
+        return
+    
+    for model_type in ("kmeans", "dbscan"):
+        try:
+            bundle = {
+                "model": artifacts[model_type],
+                "scaler": artifacts["scaler"],
+                "pca": artifacts["pca"],
+                "features": artifacts["features"]
+            }
+            bundle["W"], bundle["b"] = fuse_projection(bundle["scaler"], bundle["pca"])
+            if hasattr(bundle["model"], "cluster_centers_"):
+                bundle["centers"], bundle["center_norms"] = centroid_table(bundle["model"].cluster_centers_)
+        except Exception as e:
+            logger.error(f"Error loading {model_type} model: {str(e)}", exc_info=True)
+            continue
+        
+        # Warm up BLAS threads and sklearn's validation path; a model that cannot
+        # predict (e.g. DBSCAN) is not served
+        try:
+            _infer(bundle, np.zeros((1, len(bundle["features"])), dtype=np.float32))
+        except Exception as e:
+            logger.error(f"Warm-up inference failed for {model_type}, not serving it: {str(e)}")
+            continue
+        
+        MODELS[model_type] = bundle
+        AVAILABLE_MODELS.append(model_type)
+        logger.info(f"Loaded {model_type} model artifacts")
+        BATCH_QUEUES[model_type] = asyncio.Queue()
+        _batch_tasks.append(asyncio.create_task(
+            _batch_worker(MODELS[model_type], BATCH_QUEUES[model_type])
+        ))
+
+@app.on_event("startup")
+async def load_reference_data():
+    """Parse the reference dataset once per process."""
+    global REFERENCE_DATA
+    try:
+        REFERENCE_DATA = pd.read_csv("data/marketing_campaign.csv", sep="\t", engine="pyarrow")
+        logger.info(f"Loaded {len(REFERENCE_DATA)} reference records")
+    except Exception as e:
+        logger.error(f"Error loading reference data: {str(e)}", exc_info=True)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the batch workers and log out of the cached SMTP connection."""
+    tasks = _batch_tasks + list(_inflight_batches)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    email_service.close()
+
+async def _batch_worker(bundle, queue):
+    """Collect queued predict requests into batches and dispatch each one.
+    
+    Batches are not awaited here, so several can run on EXECUTOR at once
+    while the next one is being collected.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = loop.time() + MAX_BATCH_WAIT_MS / 1000
+        while n_rows < MAX_BATCH_ROWS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        
+        task = asyncio.create_task(_run_batch(bundle, batch))
+        _inflight_batches.add(task)
+        task.add_done_callback(_inflight_batches.discard)
+
+async def _run_batch(bundle, batch):
+    """Run one batch on the executor and resolve each request's future."""
+    loop = asyncio.get_running_loop()
+    try:
+        X = np.vstack([rows for rows, _ in batch])
+        predictions = await loop.run_in_executor(EXECUTOR, _infer, bundle, X)
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    
+    # Hand each request back its own slice of the batch
+    offset = 0
+    for rows, future in batch:
+        if not future.done():
+            future.set_result(predictions[offset:offset + len(rows)])
+        offset += len(rows)
+
 async def get_api_key(api_key: str = Header(...)):
     """Validate API key."""
     # In a real application, validate against a database of API keys
@@ -46,52 +176,78 @@ async def root():
     return {"message": "Customer Segmentation API"}
 
 @app.get("/models", dependencies=[Depends(get_api_key)])
-async def get_models():
+async def get_models(request: Request, response: Response):
     """Get available models."""
     try:
-        models = []
-        models_dir = Path("models")
-        
-        if (models_dir / "kmeans.joblib").exists():
-            models.append("kmeans")
-        if (models_dir / "dbscan.joblib").exists():
-            models.append("dbscan")
-            
-        return {"models": models}
+        # The model list only changes on restart, so let clients cache and revalidate it
+        headers = {"Cache-Control": "max-age=60", "ETag": f'"{"-".join(AVAILABLE_MODELS)}"'}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or headers["ETag"] in tags:
+                return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return {"models": AVAILABLE_MODELS}
     except Exception as e:
         logger.error(f"Error getting models: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _infer(bundle, X):
+    """Project a feature matrix with the fused scaler/PCA map and predict."""
+    X_pca = X.astype(np.float32, copy=False) @ bundle["W"].T + bundle["b"]
+    if "centers" in bundle:
+        return nearest_centroid(X_pca, bundle["centers"], bundle["center_norms"])
+    # Training fits the cluster models on float32 projections
+    return bundle["model"].predict(X_pca)
+
 @app.post("/predict/{model_type}", dependencies=[Depends(get_api_key)])
-async def predict(model_type: str, data: List[dict]):
+async def predict(model_type: str, request: Request):
     """Make predictions using the specified model."""
     try:
-        # Load models
-        models_dir = Path("models")
-        model = joblib.load(models_dir / f"{model_type.lower()}.joblib")
-        scaler = joblib.load(models_dir / "scaler.joblib")
-        pca = joblib.load(models_dir / "pca.joblib")
-        features = joblib.load(models_dir / "features.joblib")
+        # Look up preloaded models
+        bundle = MODELS.get(model_type.lower())
+        if bundle is None:
+            raise HTTPException(status_code=404, detail="Model not found")
+        features = bundle["features"]
         
-        # Prepare data
-        df = pd.DataFrame(data)
-        X = df[features]
-        X_scaled = scaler.transform(X)
-        X_pca = pca.transform(X_scaled)
+        # Parse the body directly; only the first row's keys are checked
+        try:
+            data = orjson.loads(await request.body())
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=422, detail="Expected a list of records")
+        if data:
+            missing = [feature for feature in features if feature not in data[0]]
+            if missing:
+                raise HTTPException(status_code=422, detail=f"Missing features: {', '.join(missing)}")
+        
+        # Prepare data as one contiguous array per feature
+        columns = {
+            feature: np.fromiter((row[feature] for row in data), dtype=np.float64, count=len(data))
+            for feature in features
+        }
+        X = np.column_stack([columns[feature] for feature in features])
         
-        # Make predictions
-        predictions = model.predict(X_pca)
+        # Make predictions through the model's batching queue
+        future = asyncio.get_running_loop().create_future()
+        await BATCH_QUEUES[model_type.lower()].put((X, future))
+        predictions = await future
         
         # Format response
-        results = []
-        for i, pred in enumerate(predictions):
-            results.append({
-                "customer_id": df.index[i],
-                "segment": int(pred),
-                "features": X.iloc[i].to_dict()
-            })
+        df = pd.DataFrame(columns)
+        results = [
+            {"customer_id": customer_id, "segment": segment, "features": feature_row}
+            for customer_id, segment, feature_row in zip(
+                df.index.tolist(),
+                predictions.astype(int).tolist(),
+                df.to_dict(orient="records")
+            )
+        ]
         
         return {"predictions": results}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error making predictions: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -111,6 +267,8 @@ async def get_model_status(model_type: str):
             "created_at": latest_model[4],
             "metrics": metrics
         }
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting model status: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -119,12 +277,12 @@ async def get_model_status(model_type: str):
 async def check_drift(model_type: str, data: List[dict]):
     """Check for data drift."""
     try:
-        # Load reference data
-        reference_data = pd.read_csv("data/marketing_campaign.csv")
+        if REFERENCE_DATA is None:
+            raise HTTPException(status_code=503, detail="Reference data not loaded")
         current_data = pd.DataFrame(data)
         
         # Check model health
-        results = monitor.check_model_health(model_type, current_data, reference_data)
+        results = monitor.check_model_health(model_type, current_data, REFERENCE_DATA)
         
         return {
             "model_type": model_type,
@@ -132,6 +290,8 @@ async def check_drift(model_type: str, data: List[dict]):
             "drift_metrics": results["drift_metrics"],
             "performance_metrics": results["performance_metrics"]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error checking drift: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -147,16 +307,26 @@ async def get_segments(model_type: str, limit: Optional[int] = 100):
         # Query segments from database
         segments = db.get_segments(latest_model[0], limit)
         return {"segments": segments}
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting segments: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/audit/logs", dependencies=[Depends(get_api_key)])
-async def get_audit_logs(limit: Optional[int] = 100):
-    """Get audit logs."""
+async def get_audit_logs(limit: int = Query(100, ge=0), fields: Optional[str] = None):
+    """Stream audit logs as newline-delimited JSON."""
     try:
-        logs = db.get_audit_logs(limit)
-        return {"logs": logs}
+        columns = [field.strip() for field in fields.split(",")] if fields else None
+        logs = db.iter_audit_logs(limit, columns)
+        return StreamingResponse(
+            (orjson.dumps(log) + b"\n" for log in logs),
+            media_type="application/x-ndjson"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting audit logs: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import joblib
+import os
 import plotly.express as px
 import plotly.graph_objects as go
 from pathlib import Path
@@ -19,13 +20,18 @@ st.set_page_config(
     layout="wide"
 )
 
+# One Database for all sessions; its connections are thread-local or pooled
+@st.cache_resource
+def get_database():
+    return Database()
+
 # Initialize session state
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'user' not in st.session_state:
     st.session_state.user = None
 if 'db' not in st.session_state:
-    st.session_state.db = Database()
+    st.session_state.db = get_database()
 
 def login_page():
     """Display login page."""
@@ -50,6 +56,24 @@ def login_page():
             else:
                 st.error("Invalid username or password")
 
+def cluster_means(X, labels, columns):
+    """Compute per-cluster feature means with bincount instead of groupby."""
+    # Shift labels so DBSCAN noise (-1) maps to a valid bin
+    offset = labels.min()
+    bins = (labels - offset).astype(np.intp)
+    n_bins = bins.max() + 1
+    counts = np.bincount(bins, minlength=n_bins)
+    sums = np.column_stack([
+        np.bincount(bins, weights=X[:, j], minlength=n_bins)
+        for j in range(X.shape[1])
+    ])
+    present = counts > 0
+    return pd.DataFrame(
+        sums[present] / counts[present, None],
+        columns=columns,
+        index=pd.Index(np.flatnonzero(present) + offset, name='Cluster')
+    )
+
 def main_dashboard():
     """Display main dashboard."""
     # Sidebar
@@ -74,25 +98,39 @@ def main_dashboard():
         ["K-means", "DBSCAN"]
     )
     
-    # Load models
+    # Load models; keyed by the artifacts' mtime so retraining invalidates the cache
     @st.cache_resource
-    def load_models():
+    def load_models(models_mtime):
         try:
             logger.info("Loading trained models...")
             models_dir = Path("models")
-            models = {
-                'scaler': joblib.load(models_dir / 'scaler.joblib'),
-                'pca': joblib.load(models_dir / 'pca.joblib'),
-                'kmeans': joblib.load(models_dir / 'kmeans.joblib'),
-                'dbscan': joblib.load(models_dir / 'dbscan.joblib'),
-                'features': joblib.load(models_dir / 'features.joblib')
-            }
+            models = joblib.load(models_dir / 'models.joblib')
+            models['dbscan_labels'] = np.load(models_dir / 'dbscan_labels.npy', mmap_mode='r')
             logger.info("Models loaded successfully")
             return models
         except Exception as e:
             logger.error(f"Error loading models: {str(e)}", exc_info=True)
             raise
     
+    # Load and project customer data once; results are pure functions of the CSV
+    @st.cache_data(show_spinner=False)
+    def load_and_project(features, data_mtime, models_mtime):
+        logger.info("Loading customer data...")
+        df = pd.read_csv("data/marketing_campaign.csv", sep="\t", engine="pyarrow")
+        logger.info(f"Loaded {len(df)} customer records")
+        
+        models = load_models(models_mtime)
+        X = df[list(features)].to_numpy(dtype=np.float64, copy=False)
+        X_scaled = models['scaler'].transform(X)
+        X_pca = models['pca'].transform(X_scaled)
+        return df, X_pca
+    
+    @st.cache_data(show_spinner=False)
+    def kmeans_labels(X_pca, models_mtime):
+        kmeans = load_models(models_mtime)['kmeans']
+        # Match the dtype the centroids were fitted in; training uses float32
+        return kmeans.predict(X_pca.astype(kmeans.cluster_centers_.dtype, copy=False))
+    
     # Main content
     st.title("Customer Segmentation Dashboard")
     
@@ -101,26 +139,27 @@ def main_dashboard():
     if latest_model:
         st.info(f"Using {model_type} model version: {latest_model[1]}")
         metrics = json.loads(latest_model[3])
-        st.write(f"Silhouette Score: {metrics['silhouette_score']:.4f}")
+        # Older versions predate silhouette_method and were scored exactly
+        label = "Simplified Silhouette Score" if metrics.get('silhouette_method') == 'simplified' else "Silhouette Score"
+        st.write(f"{label}: {metrics['silhouette_score']:.4f}")
     
     # Load data and models
     try:
-        models = load_models()
-        logger.info("Loading customer data...")
-        df = pd.read_csv("data/marketing_campaign.csv")
-        logger.info(f"Loaded {len(df)} customer records")
-        
-        # Preprocess data
-        X = df[models['features']]
-        X_scaled = models['scaler'].transform(X)
-        X_pca = models['pca'].transform(X_scaled)
+        data_mtime = os.path.getmtime("data/marketing_campaign.csv")
+        models_mtime = os.path.getmtime(Path("models") / 'models.joblib')
+        models = load_models(models_mtime)
+        df, X_pca = load_and_project(tuple(models['features']), data_mtime, models_mtime)
+        purchase_cols = df.columns[
+            df.columns.str.startswith('Mnt') | df.columns.str.startswith('Num')
+        ]
         
         # Get predictions
         if model_type == "K-means":
-            labels = models['kmeans'].predict(X_pca)
+            labels = kmeans_labels(X_pca, models_mtime)
             logger.info("Applied K-means clustering")
         else:
-            labels = models['dbscan'].fit_predict(X_pca)
+            # DBSCAN cannot label new points; reuse the labels saved at training time
+            labels = np.asarray(models['dbscan_labels'])
             logger.info("Applied DBSCAN clustering")
         
         # Add predictions to dataframe
@@ -135,16 +174,21 @@ def main_dashboard():
             st.plotly_chart(fig, use_container_width=True)
             
             st.subheader("Cluster Characteristics")
-            cluster_stats = df.groupby('Cluster')[models['features']].mean()
+            cluster_stats = cluster_means(
+                df[models['features']].to_numpy(dtype=np.float64),
+                labels,
+                models['features']
+            )
             st.dataframe(cluster_stats.style.background_gradient())
             logger.debug("Displayed cluster statistics")
         
         with col2:
             st.subheader("Cluster Visualization")
+            pc1, pc2 = np.ascontiguousarray(X_pca.T, dtype=np.float32)
             fig = px.scatter(
-                x=X_pca[:, 0],
-                y=X_pca[:, 1],
-                color=labels.astype(str),
+                x=pc1,
+                y=pc2,
+                color=pd.Categorical(labels),
                 title='Customer Clusters (PCA)',
                 labels={'x': 'Principal Component 1', 'y': 'Principal Component 2'}
             )
@@ -180,7 +224,6 @@ def main_dashboard():
         
         with col4:
             st.write("### Purchase Behavior")
-            purchase_cols = [col for col in df.columns if col.startswith('Mnt') or col.startswith('Num')]
             purchase_data = customer_data[purchase_cols]
             fig = px.bar(
                 x=purchase_data.index,
@@ -1,33 +1,141 @@
-import json
+import copy
 from pathlib import Path
 from typing import Dict, Any
 import os
+import types
 from dotenv import load_dotenv
+from . import json_utils
 from .logging_config import logger
 
 # Load environment variables
 load_dotenv()
 
+# Environment values read once at import
+_ENV = types.MappingProxyType({
+    name: os.getenv(name)
+    for name in (
+        'API_HOST', 'API_PORT', 'API_DEBUG', 'API_KEY',
+        'SMTP_SERVER', 'SMTP_PORT', 'SMTP_USERNAME', 'SMTP_PASSWORD', 'ALERT_EMAIL',
+        'DRIFT_THRESHOLD', 'MONITORING_INTERVAL',
+        'DATA_DIR', 'MODEL_DIR', 'LOG_DIR'
+    )
+})
+
+# Numeric and boolean environment values, parsed once; None when unset
+_API_PORT = int(_ENV['API_PORT']) if _ENV['API_PORT'] else None
+_API_DEBUG = (_ENV['API_DEBUG'] or 'false').lower() == 'true'
+_SMTP_PORT = int(_ENV['SMTP_PORT']) if _ENV['SMTP_PORT'] else None
+_DRIFT_THRESHOLD = float(_ENV['DRIFT_THRESHOLD']) if _ENV['DRIFT_THRESHOLD'] else None
+_MONITORING_INTERVAL = int(_ENV['MONITORING_INTERVAL']) if _ENV['MONITORING_INTERVAL'] else None
+
+# Consolidated configuration file, one top-level section per config
+CONFIG_FILE = 'config.json'
+
+# Legacy per-section files, read when the consolidated file is missing
+CONFIG_FILES = {
+    'app': 'app_config.json',
+    'email': 'email_config.json',
+    'monitor': 'monitor_config.json',
+    'model': 'model_config.json',
+    'api': 'api_config.json'
+}
+
+# Default configuration for each file, built once at import
+DEFAULT_CONFIGS = {
+    'app_config.json': {
+        'debug': _API_DEBUG,
+        'log_level': 'INFO',
+        'data_dir': _ENV['DATA_DIR'] or 'data',
+        'model_dir': _ENV['MODEL_DIR'] or 'models',
+        'log_dir': _ENV['LOG_DIR'] or 'logs'
+    },
+    'email_config.json': {
+        'smtp_server': _ENV['SMTP_SERVER'] or 'smtp.gmail.com',
+        'smtp_port': _SMTP_PORT or 587,
+        'sender_email': _ENV['SMTP_USERNAME'] or '',
+        'sender_password': _ENV['SMTP_PASSWORD'] or '',
+        'alert_recipients': [_ENV['ALERT_EMAIL'] or '']
+    },
+    'monitor_config.json': {
+        'drift_threshold': _DRIFT_THRESHOLD if _DRIFT_THRESHOLD is not None else 0.05,
+        'monitoring_interval': _MONITORING_INTERVAL or 24,
+        'alert_recipients': [_ENV['ALERT_EMAIL'] or ''],
+        'performance_thresholds': {
+            'accuracy': 0.8,
+            'distribution_difference': 0.1
+        }
+    },
+    'model_config.json': {
+        'kmeans': {
+            'n_clusters': 4,
+            'random_state': 42
+        },
+        'dbscan': {
+            'eps': 0.5,
+            'min_samples': 5
+        },
+        'pca': {
+            'n_components': 2
+        }
+    },
+    'api_config.json': {
+        'host': _ENV['API_HOST'] or '0.0.0.0',
+        'port': _API_PORT or 8000,
+        'debug': _API_DEBUG,
+        'api_key_header': 'X-API-Key',
+        'security': {
+            'api_key_validation': True,
+            'api_key': _ENV['API_KEY'] or '',
+            'ssl_enabled': False
+        },
+        'rate_limit': {
+            'requests': 100,
+            'period': 60  # seconds
+        }
+    }
+}
+
 class ConfigManager:
+    _instance = None
+    
+    @classmethod
+    def get(cls):
+        """Get the shared configuration manager instance."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+    
     def __init__(self, config_dir='config'):
         """Initialize configuration manager."""
         self.config_dir = Path(config_dir)
         self.config_dir.mkdir(parents=True, exist_ok=True)
+        self._config_files = dict(CONFIG_FILES)
+        self._sections = None
         self.configs = {}
-        self._load_all_configs()
     
-    def _load_all_configs(self):
-        """Load all configuration files."""
-        config_files = {
-            'app': 'app_config.json',
-            'email': 'email_config.json',
-            'monitor': 'monitor_config.json',
-            'model': 'model_config.json',
-            'api': 'api_config.json'
-        }
-        
-        for config_name, filename in config_files.items():
-            self.configs[config_name] = self._load_config(filename)
+    def _load_sections(self) -> Dict[str, Any]:
+        """Parse the consolidated configuration file on first use."""
+        if self._sections is None:
+            self._sections = {}
+            config_file = self.config_dir / CONFIG_FILE
+            if config_file.exists():
+                try:
+                    self._sections = json_utils.loads(config_file.read_bytes())
+                except Exception as e:
+                    logger.error(f"Error loading config {CONFIG_FILE}: {str(e)}", exc_info=True)
+        return self._sections
+    
+    def _load_named_config(self, config_name: str) -> Dict[str, Any]:
+        """Load one configuration, preferring the consolidated file."""
+        filename = self._config_files[config_name]
+        sections = self._load_sections()
+        if config_name in sections:
+            try:
+                return self._apply_env_overrides(filename, sections[config_name])
+            except Exception as e:
+                logger.error(f"Error loading config section {config_name}: {str(e)}", exc_info=True)
+                return self._get_default_config(filename)
+        return self._load_config(filename)
     
     def _load_config(self, filename: str) -> Dict[str, Any]:
         """Load a specific configuration file."""
@@ -37,103 +145,59 @@ class ConfigManager:
                 logger.warning(f"Config file not found: {filename}")
                 return self._get_default_config(filename)
             
-            with open(config_file) as f:
-                config = json.load(f)
-                
-            # Override with environment variables if they exist
-            if filename == 'api_config.json':
-                config['host'] = os.getenv('API_HOST', config.get('host', '0.0.0.0'))
-                config['port'] = int(os.getenv('API_PORT', config.get('port', 8000)))
-                config['debug'] = os.getenv('API_DEBUG', 'false').lower() == 'true'
-                config['security']['api_key'] = os.getenv('API_KEY', '')
-                
-            elif filename == 'email_config.json':
-                config['smtp_server'] = os.getenv('SMTP_SERVER', config.get('smtp_server', ''))
-                config['smtp_port'] = int(os.getenv('SMTP_PORT', config.get('smtp_port', 587)))
-                config['sender_email'] = os.getenv('SMTP_USERNAME', config.get('sender_email', ''))
-                config['sender_password'] = os.getenv('SMTP_PASSWORD', config.get('sender_password', ''))
-                config['alert_recipients'] = [os.getenv('ALERT_EMAIL', '')]
-                
-            elif filename == 'monitor_config.json':
-                config['drift_threshold'] = float(os.getenv('DRIFT_THRESHOLD', config.get('drift_threshold', 0.05)))
-                config['monitoring_interval'] = int(os.getenv('MONITORING_INTERVAL', config.get('monitoring_interval', 24)))
-                
-            return config
+            with open(config_file, 'rb') as f:
+                config = json_utils.loads(f.read())
+            
+            return self._apply_env_overrides(filename, config)
             
         except Exception as e:
             logger.error(f"Error loading config {filename}: {str(e)}", exc_info=True)
             return self._get_default_config(filename)
     
+    def _apply_env_overrides(self, filename: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Override configuration values with environment variables if they exist."""
+        if filename == 'api_config.json':
+            config['host'] = _ENV['API_HOST'] or config.get('host', '0.0.0.0')
+            config['port'] = _API_PORT or int(config.get('port', 8000))
+            config['debug'] = _API_DEBUG
+            config['security']['api_key'] = _ENV['API_KEY'] or ''
+            
+        elif filename == 'email_config.json':
+            config['smtp_server'] = _ENV['SMTP_SERVER'] or config.get('smtp_server', '')
+            config['smtp_port'] = _SMTP_PORT or int(config.get('smtp_port', 587))
+            config['sender_email'] = _ENV['SMTP_USERNAME'] or config.get('sender_email', '')
+            config['sender_password'] = _ENV['SMTP_PASSWORD'] or config.get('sender_password', '')
+            config['alert_recipients'] = [_ENV['ALERT_EMAIL'] or '']
+            
+        elif filename == 'monitor_config.json':
+            if _DRIFT_THRESHOLD is not None:
+                config['drift_threshold'] = _DRIFT_THRESHOLD
+            else:
+                config['drift_threshold'] = float(config.get('drift_threshold', 0.05))
+            config['monitoring_interval'] = _MONITORING_INTERVAL or int(config.get('monitoring_interval', 24))
+        
+        return config
+    
     def _get_default_config(self, filename: str) -> Dict[str, Any]:
         """Get default configuration for a specific file."""
-        default_configs = {
-            'app_config.json': {
-                'debug': os.getenv('API_DEBUG', 'false').lower() == 'true',
-                'log_level': 'INFO',
-                'data_dir': os.getenv('DATA_DIR', 'data'),
-                'model_dir': os.getenv('MODEL_DIR', 'models'),
-                'log_dir': os.getenv('LOG_DIR', 'logs')
-            },
-            'email_config.json': {
-                'smtp_server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
-                'smtp_port': int(os.getenv('SMTP_PORT', 587)),
-                'sender_email': os.getenv('SMTP_USERNAME', ''),
-                'sender_password': os.getenv('SMTP_PASSWORD', ''),
-                'alert_recipients': [os.getenv('ALERT_EMAIL', '')]
-            },
-            'monitor_config.json': {
-                'drift_threshold': float(os.getenv('DRIFT_THRESHOLD', 0.05)),
-                'monitoring_interval': int(os.getenv('MONITORING_INTERVAL', 24)),
-                'alert_recipients': [os.getenv('ALERT_EMAIL', '')],
-                'performance_thresholds': {
-                    'accuracy': 0.8,
-                    'distribution_difference': 0.1
-                }
-            },
-            'model_config.json': {
-                'kmeans': {
-                    'n_clusters': 4,
-                    'random_state': 42
-                },
-                'dbscan': {
-                    'eps': 0.5,
-                    'min_samples': 5
-                },
-                'pca': {
-                    'n_components': 2
-                }
-            },
-            'api_config.json': {
-                'host': os.getenv('API_HOST', '0.0.0.0'),
-                'port': int(os.getenv('API_PORT', 8000)),
-                'debug': os.getenv('API_DEBUG', 'false').lower() == 'true',
-                'api_key_header': 'X-API-Key',
-                'security': {
-                    'api_key_validation': True,
-                    'api_key': os.getenv('API_KEY', ''),
-                    'ssl_enabled': False
-                },
-                'rate_limit': {
-                    'requests': 100,
-                    'period': 60  # seconds
-                }
-            }
-        }
-        
-        return default_configs.get(filename, {})
+        return copy.deepcopy(DEFAULT_CONFIGS.get(filename, {}))
     
     def get_config(self, config_name: str) -> Dict[str, Any]:
-        """Get a specific configuration."""
-        return self.configs.get(config_name, {})
+        """Get a specific configuration, loading it on first access."""
+        if config_name not in self._config_files:
+            return {}
+        if config_name not in self.configs:
+            self.configs[config_name] = self._load_named_config(config_name)
+        return self.configs[config_name]
     
     def update_config(self, config_name: str, updates: Dict[str, Any]):
         """Update a specific configuration."""
-        if config_name not in self.configs:
+        if config_name not in self._config_files:
             logger.warning(f"Config {config_name} not found")
             return False
         
         try:
-            self.configs[config_name].update(updates)
+            self.get_config(config_name).update(updates)
             self._save_config(config_name)
             logger.info(f"Config {config_name} updated successfully")
             return True
@@ -142,18 +206,21 @@ class ConfigManager:
             return False
     
     def _save_config(self, config_name: str):
-        """Save a configuration to file."""
+        """Save all configurations to the consolidated file atomically."""
         try:
-            config_file = self.config_dir / f"{config_name}_config.json"
-            with open(config_file, 'w') as f:
-                json.dump(self.configs[config_name], f, indent=4)
+            config_file = self.config_dir / CONFIG_FILE
+            tmp_file = config_file.with_suffix('.json.tmp')
+            # The file holds every section, so load any that are still pending
+            configs = {name: self.get_config(name) for name in self._config_files}
+            with open(tmp_file, 'wb') as f:
+                f.write(json_utils.dumps(configs, indent=True))
+            os.replace(tmp_file, config_file)
         except Exception as e:
             logger.error(f"Error saving config {config_name}: {str(e)}", exc_info=True)
     
     def create_default_configs(self):
-        """Create default configuration files if they don't exist."""
-        for config_name in self.configs:
-            config_file = self.config_dir / f"{config_name}_config.json"
-            if not config_file.exists():
-                self._save_config(config_name)
-                logger.info(f"Created default config file: {config_file}") 
\ No newline at end of file
+        """Create the consolidated configuration file if it doesn't exist."""
+        config_file = self.config_dir / CONFIG_FILE
+        if not config_file.exists():
+            self._save_config(None)
+            logger.info(f"Created default config file: {config_file}") 
\ No newline at end of file
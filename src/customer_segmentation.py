@@ -1,43 +1,60 @@
+from abc import ABC, abstractmethod
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans, DBSCAN
+from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN
 from sklearn.metrics import silhouette_score
 import matplotlib.pyplot as plt
 import seaborn as sns
+from joblib import Parallel, delayed
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial.distance import cdist
 
-def load_data(file_path):
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+def load_data(file_path, sep='\t'):
     """Load and preprocess the marketing campaign data."""
-    df = pd.read_csv(file_path)
+    df = pd.read_csv(file_path, sep=sep, engine='pyarrow')
     return df
 
+# Columns used for clustering
+FEATURES = ['Income', 'Recency', 'MntWines', 'MntFruits', 'MntMeatProducts',
+            'MntFishProducts', 'MntSweetProducts', 'MntGoldProds', 'NumDealsPurchases',
+            'NumWebPurchases', 'NumCatalogPurchases', 'NumStorePurchases', 'NumWebVisitsMonth']
+
 def preprocess_data(df):
     """Preprocess the data for clustering."""
-    # Select relevant columns
-    features = ['Income', 'Recency', 'MntWines', 'MntFruits', 'MntMeatProducts',
-               'MntFishProducts', 'MntSweetProducts', 'MntGoldProds', 'NumDealsPurchases',
-               'NumWebPurchases', 'NumCatalogPurchases', 'NumStorePurchases', 'NumWebVisitsMonth']
+    features = list(FEATURES)
     
-    # Standardize the features
-    scaler = StandardScaler()
-    X = scaler.fit_transform(df[features])
+    # Standardize the features in place on a float32 copy of the data
+    X = df[features].to_numpy(dtype=np.float32)
+    scaler = StandardScaler(copy=False)
+    X = scaler.fit_transform(X)
     
     return X, features
 
 def perform_pca(X, n_components=2):
     """Perform PCA for dimensionality reduction."""
-    pca = PCA(n_components=n_components)
+    pca = PCA(n_components=n_components, svd_solver='randomized', random_state=42)
     X_pca = pca.fit_transform(X)
     return X_pca, pca
 
+def _kmeans_inertia(X, k):
+    """Fit a mini-batch K-means model and return its inertia."""
+    kmeans = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=1, batch_size=1024)
+    kmeans.fit(X)
+    return kmeans.inertia_
+
 def find_optimal_k(X, max_k=10):
     """Find the optimal number of clusters using the elbow method."""
-    wcss = []
-    for k in range(1, max_k + 1):
-        kmeans = KMeans(n_clusters=k, random_state=42)
-        kmeans.fit(X)
-        wcss.append(kmeans.inertia_)
+    wcss = Parallel(n_jobs=-1, prefer='threads')(
+        delayed(_kmeans_inertia)(X, k) for k in range(1, max_k + 1)
+    )
     
     return wcss
 
@@ -47,12 +64,224 @@ def perform_kmeans(X, n_clusters):
     labels = kmeans.fit_predict(X)
     return labels, kmeans
 
-def perform_dbscan(X, eps=0.5, min_samples=5):
-    """Perform DBSCAN clustering."""
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    labels = dbscan.fit_predict(X)
+def _faiss_radius_graph(X, eps, n_neighbors):
+    """Build a symmetric sparse eps-neighborhood distance graph from a faiss k-NN search.
+    
+    Each point keeps at most n_neighbors neighbors within eps. The edge set is
+    the union of both directions, so "j is among i's k nearest" also links i
+    to j and sklearn's DBSCAN cannot form clusters smaller than min_samples.
+    Points with more than n_neighbors neighbors within eps can still lose
+    some edges, so dense regions remain approximate.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n_samples = X.shape[0]
+    index = faiss.IndexFlatL2(X.shape[1])
+    index.add(X)
+    sq_dist, neighbors = index.search(X, min(n_neighbors, n_samples))
+    
+    # faiss returns squared L2 distances; keep only neighbors within eps
+    dist = np.sqrt(np.maximum(sq_dist, 0))
+    mask = (neighbors >= 0) & (dist <= eps)
+    rows = np.nonzero(mask)[0]
+    cols = neighbors[mask]
+    
+    # Union of i->j and j->i edges; unlike graph.maximum(graph.T) this keeps
+    # zero distances between duplicate points as explicit entries
+    all_rows = np.concatenate([rows, cols])
+    all_cols = np.concatenate([cols, rows])
+    all_dist = np.concatenate([dist[mask], dist[mask]])
+    _, unique_idx = np.unique(all_rows.astype(np.int64) * n_samples + all_cols, return_index=True)
+    return csr_matrix(
+        (all_dist[unique_idx], (all_rows[unique_idx], all_cols[unique_idx])),
+        shape=(n_samples, n_samples)
+    )
+
+class _FaissDBSCAN(ABC):
+    """DBSCAN whose eps-neighborhoods come from a faiss index range search.
+    
+    Follows the scikit-learn DBSCAN interface (fit, fit_predict, labels_,
+    core_sample_indices_). Subclasses provide the index via _build_index().
+    """
+    
+    @abstractmethod
+    def _build_index(self, X):
+        """Return a faiss index over X that supports range_search."""
+    
+    def fit(self, X, y=None):
+        if faiss is None:
+            raise ImportError(f"faiss is required for {type(self).__name__}")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        
+        index = self._build_index(X)
+        # faiss range search radii are squared L2 distances
+        lims, _, neighbors = index.range_search(X, self.eps ** 2)
+        
+        counts = np.diff(lims).astype(np.intp)
+        rows = np.repeat(np.arange(n_samples), counts)
+        core = counts >= self.min_samples
+        
+        # Clusters are the connected components of the core-to-core neighbor graph
+        core_edges = core[rows] & core[neighbors]
+        graph = csr_matrix(
+            (np.ones(core_edges.sum(), dtype=np.int8), (rows[core_edges], neighbors[core_edges])),
+            shape=(n_samples, n_samples)
+        )
+        core_idx = np.flatnonzero(core)
+        _, components = connected_components(graph[core_idx][:, core_idx], directed=False)
+        
+        labels = np.full(n_samples, -1, dtype=np.intp)
+        labels[core_idx] = components
+        # Border points join the cluster of a neighboring core point
+        border_edges = ~core[rows] & core[neighbors]
+        labels[rows[border_edges]] = labels[neighbors[border_edges]]
+        
+        self.core_sample_indices_ = core_idx
+        self.labels_ = labels
+        return self
+    
+    def fit_predict(self, X, y=None):
+        return self.fit(X).labels_
+
+class HNSWDBSCAN(_FaissDBSCAN):
+    """DBSCAN whose eps-neighborhoods come from a faiss HNSW graph range search.
+    
+    The neighborhood search is approximate, so a few points near the eps
+    boundary may be missed on large inputs.
+    """
+    
+    def __init__(self, eps=0.5, min_samples=5, M=32, ef_construction=100, ef_search=64):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+    
+    def _build_index(self, X):
+        index = faiss.IndexHNSWFlat(X.shape[1], self.M)
+        index.hnsw.efConstruction = self.ef_construction
+        index.hnsw.efSearch = self.ef_search
+        index.add(X)
+        return index
+
+class IVFDBSCAN(_FaissDBSCAN):
+    """DBSCAN whose eps-neighborhoods come from a faiss IVF range search.
+    
+    Points are bucketed into Voronoi cells around nlist centroids and each
+    query only scans the nprobe nearest cells. nlist defaults to
+    max(2 * sqrt(n_samples), 20), capped so every cell gets the 39 training
+    points faiss asks for, and nprobe to min(nlist // 4, 10); neighbors in
+    cells that are not probed are missed. Inputs too small for 20 cells use
+    an exact flat range search instead.
+    """
+    
+    # faiss warns below 39 training points per centroid
+    MIN_POINTS_PER_CELL = 39
+    MIN_NLIST = 20
+    
+    def __init__(self, eps=0.5, min_samples=5, nlist=None, nprobe=None):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.nlist = nlist
+        self.nprobe = nprobe
+    
+    def _build_index(self, X):
+        nlist = self.nlist or int(max(2 * np.sqrt(len(X)), self.MIN_NLIST))
+        nlist = min(nlist, len(X) // self.MIN_POINTS_PER_CELL)
+        if nlist < self.MIN_NLIST:
+            index = faiss.IndexFlatL2(X.shape[1])
+            index.add(X)
+            return index
+        
+        quantizer = faiss.IndexFlatL2(X.shape[1])
+        index = faiss.IndexIVFFlat(quantizer, X.shape[1], nlist)
+        index.train(X)
+        index.add(X)
+        index.nprobe = self.nprobe or max(min(nlist // 4, 10), 1)
+        return index
+
+def perform_dbscan(X, eps=0.5, min_samples=5, use_faiss=False):
+    """Perform DBSCAN clustering.
+    
+    With use_faiss, neighborhoods come from a symmetrized faiss k-NN search
+    over 4 * min_samples neighbors. Points with more neighbors than that
+    within eps have some of them dropped, so results in dense regions
+    approximate exact DBSCAN.
+    """
+    if use_faiss:
+        if faiss is None:
+            raise ImportError("faiss is required for use_faiss=True")
+        graph = _faiss_radius_graph(X, eps, 4 * min_samples)
+        dbscan = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed')
+        labels = dbscan.fit_predict(graph)
+    else:
+        dbscan = DBSCAN(eps=eps, min_samples=min_samples, n_jobs=-1)
+        labels = dbscan.fit_predict(X)
     return labels, dbscan
 
+def centroid_silhouette_score(X, centers):
+    """Estimate the silhouette score from distances to the two nearest centroids.
+
+    For each point a is the distance to its nearest centroid and b the
+    distance to the second nearest, giving the simplified silhouette
+    (b - a) / max(a, b). This is O(n_samples * n_clusters) instead of
+    the O(n_samples ** 2) pairwise distances of the exact score.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    centers = np.asarray(centers, dtype=np.float32)
+    sq_dist = (
+        (X * X).sum(axis=1)[:, None]
+        - 2.0 * (X @ centers.T)
+        + (centers * centers).sum(axis=1)[None, :]
+    )
+    nearest_two = np.sqrt(np.maximum(np.partition(sq_dist, 1, axis=1)[:, :2], 0))
+    a, b = nearest_two[:, 0], nearest_two[:, 1]
+    denom = np.maximum(a, b)
+    scores = np.divide(b - a, denom, out=np.zeros_like(denom), where=denom > 0)
+    return float(scores.mean())
+
+def silhouette_batched(X, labels, batch_size=4096):
+    """Compute the exact silhouette score without the full pairwise distance matrix.
+    
+    Distances are computed batch_size rows at a time and summed per cluster,
+    so peak memory is O(batch_size * n_samples) instead of O(n_samples ** 2).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    _, labels = np.unique(labels, return_inverse=True)
+    n_clusters = labels.max() + 1
+    if not 1 < n_clusters < len(X):
+        raise ValueError("Number of labels is %d. Valid values are 2 to n_samples - 1 "
+                         "(inclusive)" % n_clusters)
+    counts = np.bincount(labels, minlength=n_clusters)
+    
+    # One-hot membership lets each batch's per-cluster sums be a single matmul
+    membership = np.zeros((len(X), n_clusters))
+    membership[np.arange(len(X)), labels] = 1.0
+    
+    scores = np.empty(len(X))
+    for start in range(0, len(X), batch_size):
+        stop = min(start + batch_size, len(X))
+        cluster_dist = cdist(X[start:stop], X) @ membership
+        batch_labels = labels[start:stop]
+        rows = np.arange(stop - start)
+        own_count = counts[batch_labels]
+        
+        a = cluster_dist[rows, batch_labels] / np.maximum(own_count - 1, 1)
+        cluster_dist /= counts
+        cluster_dist[rows, batch_labels] = np.inf
+        b = cluster_dist.min(axis=1)
+        
+        s = (b - a) / np.maximum(a, b)
+        scores[start:stop] = np.where(own_count > 1, np.nan_to_num(s), 0.0)
+    return float(scores.mean())
+
+def dbscan_silhouette_score(X, labels, batch_size=4096):
+    """Silhouette score of the non-noise DBSCAN points, or NaN if fewer than 2 clusters."""
+    clustered = labels != -1
+    if len(np.unique(labels[clustered])) < 2:
+        return float('nan')
+    return silhouette_batched(X[clustered], labels[clustered], batch_size=batch_size)
+
 def plot_clusters(X, labels, title):
     """Plot the clusters."""
     plt.figure(figsize=(10, 6))
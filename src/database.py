@@ -1,17 +1,177 @@
+import collections
 import sqlite3
 import hashlib
+import queue
+import threading
+import time
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 from .logging_config import logger
 
+# Columns clients may request from the audit log
+AUDIT_LOG_COLUMNS = ('id', 'user_id', 'action', 'details', 'created_at')
+
+# Buffered audit entries are written once this many accumulate
+AUDIT_BATCH_SIZE = 1024
+
+# Streamed audit logs are read this many rows at a time
+AUDIT_STREAM_CHUNK = 256
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled read connection becomes free in time."""
+
+# SQL statements, kept as module constants so each call reuses the same string
+_SQL_CREATE_USER = '''
+    INSERT INTO users (username, password_hash, email, role)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SQL_AUTH = '''
+    SELECT id, username, role, password_hash FROM users
+    WHERE username = ? AND password_hash IN (?, ?)
+'''
+
+_SQL_UPDATE_LOGIN = '''
+    UPDATE users SET last_login = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+
+_SQL_UPDATE_LOGIN_UPGRADE_HASH = '''
+    UPDATE users SET last_login = CURRENT_TIMESTAMP, password_hash = ?
+    WHERE id = ?
+'''
+
+_SQL_INSERT_AUDIT = '''
+    INSERT INTO audit_log (user_id, action, details, created_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SQL_INSERT_MODEL_VERSION = '''
+    INSERT INTO model_versions (version, model_type, performance_metrics, created_by)
+    VALUES (?, ?, ?, ?)
+'''
+
+_SQL_INSERT_SEGMENT = '''
+    INSERT INTO customer_segments
+        (customer_id, segment_id, model_version_id, confidence_score, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+_SQL_LATEST_MODEL_VERSION = '''
+    SELECT * FROM model_versions
+    WHERE model_type = ?
+    ORDER BY created_at DESC
+    LIMIT 1
+'''
+
+_SQL_SEGMENTS = '''
+    SELECT customer_id, segment_id, confidence_score, created_at
+    FROM customer_segments
+    WHERE model_version_id = ?
+    LIMIT ?
+'''
+
+_SQL_AUDIT_LOGS = '''
+    SELECT * FROM audit_log
+    ORDER BY created_at DESC
+    LIMIT ?
+'''
+
+class _AuditWriter:
+    """Buffer audit entries and write them in batches from a background thread.
+    
+    The thread and its connection start with the first entry. The thread only
+    references this writer, not the Database, so an unclosed Database can
+    still be garbage collected; its finalizer then calls close().
+    """
+
+    def __init__(self, db_path, flush_interval):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._buf = collections.deque()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def append(self, entry):
+        """Buffer one entry and return the number of entries pending."""
+        with self._lock:
+            self._buf.append(entry)
+            if self._thread is None and not self._stop.is_set():
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            return len(self._buf)
+
+    def _run(self):
+        """Flush buffered entries every flush_interval seconds."""
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered entries in a single transaction."""
+        with self._lock:
+            if not self._buf or self._conn is None:
+                return
+            rows = list(self._buf)
+            self._buf.clear()
+            try:
+                self._conn.executemany(_SQL_INSERT_AUDIT, rows)
+                self._conn.commit()
+                logger.debug(f"Flushed {len(rows)} audit log entries")
+            except Exception as e:
+                logger.error(f"Error flushing audit log: {str(e)}", exc_info=True)
+
+    def close(self):
+        """Stop the thread, write pending entries and close the connection."""
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
 class Database:
-    def __init__(self, db_path='data/customer_segmentation.db'):
+    def __init__(self, db_path='data/customer_segmentation.db', pool_size=4, audit_flush_interval=1.0,
+                 pool_timeout=5.0):
         """Initialize the database connection."""
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.pool_timeout = pool_timeout
+        self._tls = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pool = queue.Queue(maxsize=pool_size)
         self._init_db()
+        self._init_pool(pool_size)
+        self._init_audit_writer(audit_flush_interval)
+
+    @property
+    def conn(self):
+        """Writer connection for the calling thread, opened on first use."""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # WAL lets pooled readers run alongside the writer connections
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-65536')
+            self._tls.conn = conn
+            self._tls.cursor = conn.cursor()
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def cursor(self):
+        """Cursor on the calling thread's writer connection."""
+        self.conn
+        return self._tls.cursor
 
     def _init_db(self):
         """Initialize the database with required tables."""
@@ -19,15 +179,12 @@ class Database:
             # Create database directory if it doesn't exist
             Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
             
-            self.conn = sqlite3.connect(self.db_path)
-            self.cursor = self.conn.cursor()
-            
             # Create users table
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
+                    password_hash BLOB NOT NULL,
                     email TEXT UNIQUE NOT NULL,
                     role TEXT NOT NULL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -73,6 +230,20 @@ class Database:
                 )
             ''')
             
+            # Indexes for the latest-version lookup, segment reads and per-user audit history
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_mv_type_created
+                ON model_versions (model_type, created_at DESC)
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_segments_mv
+                ON customer_segments (model_version_id)
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_audit_user_time
+                ON audit_log (user_id, created_at)
+            ''')
+            
             self.conn.commit()
             logger.info("Database initialized successfully")
             
@@ -80,14 +251,62 @@ class Database:
             logger.error(f"Error initializing database: {str(e)}", exc_info=True)
             raise
 
+    def _init_pool(self, pool_size):
+        """Open read-only connections shared by query methods."""
+        uri = f"file:{Path(self.db_path).resolve().as_posix()}?mode=ro"
+        for _ in range(pool_size):
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA cache_size=-20000')
+            self._pool.put(conn)
+
+    def _init_audit_writer(self, flush_interval):
+        """Set up batched audit writes, flushed on close(), garbage collection or exit."""
+        self._audit = _AuditWriter(self.db_path, flush_interval)
+        self._audit_finalizer = weakref.finalize(self, self._audit.close)
+
+    def flush_audit(self):
+        """Write all buffered audit entries in a single transaction."""
+        self._audit.flush()
+
+    @contextmanager
+    def transaction(self):
+        """Group writes on the calling thread's connection into a single commit."""
+        self._tls.in_transaction = True
+        try:
+            yield self
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._tls.in_transaction = False
+
+    def _in_transaction(self):
+        return getattr(self._tls, 'in_transaction', False)
+
+    def _commit(self):
+        """Commit unless the calling thread is inside transaction()."""
+        if not self._in_transaction():
+            self.conn.commit()
+
+    @contextmanager
+    def _acquire(self):
+        """Borrow a pooled read connection, waiting at most pool_timeout seconds."""
+        try:
+            conn = self._pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No database connection available within {self.pool_timeout}s") from None
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
     def create_user(self, username, password, email, role='user'):
         """Create a new user."""
         try:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            self.cursor.execute('''
-                INSERT INTO users (username, password_hash, email, role)
-                VALUES (?, ?, ?, ?)
-            ''', (username, password_hash, email, role))
+            password_hash = hashlib.sha256(password.encode('utf-8', 'surrogatepass')).digest()
+            self.cursor.execute(_SQL_CREATE_USER, (username, password_hash, email, role))
             self.conn.commit()
             logger.info(f"User {username} created successfully")
             return True
@@ -101,19 +320,17 @@ class Database:
     def authenticate_user(self, username, password):
         """Authenticate a user."""
         try:
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            self.cursor.execute('''
-                SELECT id, username, role FROM users
-                WHERE username = ? AND password_hash = ?
-            ''', (username, password_hash))
+            digest = hashlib.sha256(password.encode('utf-8', 'surrogatepass')).digest()
+            # Accounts created before hashes were stored as raw bytes hold the hex digest
+            self.cursor.execute(_SQL_AUTH, (username, digest, digest.hex()))
             user = self.cursor.fetchone()
             
             if user:
-                # Update last login
-                self.cursor.execute('''
-                    UPDATE users SET last_login = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (user[0],))
+                # Update last login, upgrading a legacy hex hash to raw bytes
+                if isinstance(user[3], str):
+                    self.cursor.execute(_SQL_UPDATE_LOGIN_UPGRADE_HASH, (digest, user[0]))
+                else:
+                    self.cursor.execute(_SQL_UPDATE_LOGIN, (user[0],))
                 self.conn.commit()
                 logger.info(f"User {username} authenticated successfully")
                 return {'id': user[0], 'username': user[1], 'role': user[2]}
@@ -123,13 +340,13 @@ class Database:
             return None
 
     def log_audit(self, user_id, action, details=None):
-        """Log an audit entry."""
+        """Buffer an audit entry; entries are written in batches by flush_audit()."""
         try:
-            self.cursor.execute('''
-                INSERT INTO audit_log (user_id, action, details)
-                VALUES (?, ?, ?)
-            ''', (user_id, action, details))
-            self.conn.commit()
+            # Same format and UTC clock as SQLite's CURRENT_TIMESTAMP
+            created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+            pending = self._audit.append((user_id, action, details, created_at))
+            if pending >= AUDIT_BATCH_SIZE:
+                self.flush_audit()
             logger.debug(f"Audit log entry created: {action}")
         except Exception as e:
             logger.error(f"Error creating audit log: {str(e)}", exc_info=True)
@@ -137,46 +354,135 @@ class Database:
     def save_model_version(self, version, model_type, performance_metrics, user_id):
         """Save a new model version."""
         try:
-            self.cursor.execute('''
-                INSERT INTO model_versions (version, model_type, performance_metrics, created_by)
-                VALUES (?, ?, ?, ?)
-            ''', (version, model_type, performance_metrics, user_id))
-            self.conn.commit()
+            self.cursor.execute(_SQL_INSERT_MODEL_VERSION, (version, model_type, performance_metrics, user_id))
+            self._commit()
             model_id = self.cursor.lastrowid
             logger.info(f"Model version {version} saved successfully")
             return model_id
         except Exception as e:
+            # Let transaction() roll back the whole batch
+            if self._in_transaction():
+                raise
             logger.error(f"Error saving model version: {str(e)}", exc_info=True)
             return None
 
     def save_customer_segments(self, segments_df, model_version_id):
         """Save customer segments to the database."""
         try:
-            segments_df['model_version_id'] = model_version_id
-            segments_df['created_at'] = datetime.now()
-            segments_df.to_sql('customer_segments', self.conn, if_exists='append', index=False)
+            created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows = (
+                (customer_id, segment_id, model_version_id, confidence_score, created_at)
+                for customer_id, segment_id, confidence_score in segments_df[
+                    ['customer_id', 'segment_id', 'confidence_score']
+                ].itertuples(index=False, name=None)
+            )
+            # One transaction for the whole batch
+            self.cursor.executemany(_SQL_INSERT_SEGMENT, rows)
+            self._commit()
             logger.info(f"Customer segments saved for model version {model_version_id}")
             return True
         except Exception as e:
+            if self._in_transaction():
+                raise
+            self.conn.rollback()
             logger.error(f"Error saving customer segments: {str(e)}", exc_info=True)
             return False
 
     def get_latest_model_version(self, model_type):
         """Get the latest model version."""
         try:
-            self.cursor.execute('''
-                SELECT * FROM model_versions
-                WHERE model_type = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-            ''', (model_type,))
-            return self.cursor.fetchone()
+            with self._acquire() as conn:
+                row = conn.execute(_SQL_LATEST_MODEL_VERSION, (model_type,)).fetchone()
+            return tuple(row) if row else None
+        except PoolTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error getting latest model version: {str(e)}", exc_info=True)
             return None
 
+    def get_segments(self, model_version_id, limit=100):
+        """Get customer segments for a model version."""
+        try:
+            with self._acquire() as conn:
+                rows = conn.execute(_SQL_SEGMENTS, (model_version_id, limit)).fetchall()
+            return [dict(row) for row in rows]
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting customer segments: {str(e)}", exc_info=True)
+            return []
+
+    def get_audit_logs(self, limit=100):
+        """Get the most recent audit log entries."""
+        self.flush_audit()
+        try:
+            with self._acquire() as conn:
+                rows = conn.execute(_SQL_AUDIT_LOGS, (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        except PoolTimeout:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting audit logs: {str(e)}", exc_info=True)
+            return []
+
+    def iter_audit_logs(self, limit=100, fields=None):
+        """Stream the most recent audit log entries, optionally projected to fields.
+        
+        Rows are read AUDIT_STREAM_CHUNK at a time with keyset pagination on
+        (created_at, id), so a pooled connection is only held while a chunk is
+        fetched and never while the consumer is busy. The first chunk is read
+        before returning, so PoolTimeout reaches the caller.
+        """
+        self.flush_audit()
+        # SQLite treats a negative LIMIT as no limit, which would defeat the chunking
+        limit = max(limit, 0)
+        fields = list(fields) if fields else list(AUDIT_LOG_COLUMNS)
+        unknown = set(fields) - set(AUDIT_LOG_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown audit log fields: {', '.join(sorted(unknown))}")
+        
+        columns = f"id AS _key_id, created_at AS _key_time, {', '.join(fields)}"
+        first_query = f'''
+            SELECT {columns} FROM audit_log
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        '''
+        next_query = f'''
+            SELECT {columns} FROM audit_log
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        '''
+        with self._acquire() as conn:
+            rows = conn.execute(first_query, (min(limit, AUDIT_STREAM_CHUNK),)).fetchall()
+        return self._iter_chunks(rows, next_query, limit)
+
+    def _iter_chunks(self, rows, next_query, limit):
+        """Yield keyset-paginated rows as dicts, fetching each further chunk from the pool."""
+        try:
+            remaining = limit
+            while rows:
+                for row in rows:
+                    # Drop the two leading pagination keys
+                    yield dict(zip(row.keys()[2:], tuple(row)[2:]))
+                remaining -= len(rows)
+                if remaining <= 0 or len(rows) < AUDIT_STREAM_CHUNK:
+                    break
+                last = rows[-1]
+                params = (last['_key_time'], last['_key_id'], min(remaining, AUDIT_STREAM_CHUNK))
+                with self._acquire() as conn:
+                    rows = conn.execute(next_query, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error streaming query results: {str(e)}", exc_info=True)
+
     def close(self):
         """Close the database connection."""
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed") 
\ No newline at end of file
+        self._audit_finalizer()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._tls = threading.local()
+        logger.info("Database connection closed") 
\ No newline at end of file
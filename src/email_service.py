@@ -2,38 +2,127 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-import json
-from pathlib import Path
+from string import Template
+from . import json_utils
 from .logging_config import logger
 
+# Email templates, parsed once at import
+_TRAINING_BODY = Template("""
+        Model training has been completed successfully.
+        
+        Model Type: $model_type
+        Timestamp: $timestamp
+        
+        Performance Metrics:
+        $metrics
+        """)
+
+_TRAINING_HTML = Template("""
+        <html>
+            <body>
+                <h2>Model Training Complete</h2>
+                <p><strong>Model Type:</strong> $model_type</p>
+                <p><strong>Timestamp:</strong> $timestamp</p>
+                <h3>Performance Metrics:</h3>
+                <pre>$metrics</pre>
+            </body>
+        </html>
+        """)
+
+_DRIFT_BODY = Template("""
+        Model drift has been detected.
+        
+        Model Type: $model_type
+        Timestamp: $timestamp
+        
+        Drift Metrics:
+        $metrics
+        """)
+
+_DRIFT_HTML = Template("""
+        <html>
+            <body>
+                <h2 style="color: red;">Model Drift Alert</h2>
+                <p><strong>Model Type:</strong> $model_type</p>
+                <p><strong>Timestamp:</strong> $timestamp</p>
+                <h3>Drift Metrics:</h3>
+                <pre>$metrics</pre>
+            </body>
+        </html>
+        """)
+
+_SYSTEM_BODY = Template("""
+        System Alert
+        
+        Type: $alert_type
+        Timestamp: $timestamp
+        
+        Message:
+        $message
+        """)
+
+_SYSTEM_HTML = Template("""
+        <html>
+            <body>
+                <h2 style="color: orange;">System Alert</h2>
+                <p><strong>Type:</strong> $alert_type</p>
+                <p><strong>Timestamp:</strong> $timestamp</p>
+                <h3>Message:</h3>
+                <p>$message</p>
+            </body>
+        </html>
+        """)
+
 class EmailService:
-    def __init__(self, config_path='config/email_config.json'):
-        """Initialize email service with configuration."""
-        self.config = self._load_config(config_path)
+    def __init__(self, config):
+        """Initialize email service with an already-loaded configuration."""
+        self.config = config
         self.smtp_server = self.config.get('smtp_server')
         self.smtp_port = self.config.get('smtp_port')
         self.sender_email = self.config.get('sender_email')
         self.sender_password = self.config.get('sender_password')
+        self._smtp = None
+        
+    def _get_conn(self):
+        """Return a logged-in SMTP connection, reusing the previous one while it is alive."""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
         
-    def _load_config(self, config_path):
-        """Load email configuration from file."""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
         try:
-            config_file = Path(config_path)
-            if not config_file.exists():
-                logger.warning(f"Email config file not found: {config_path}")
-                return {}
-            with open(config_file) as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading email config: {str(e)}", exc_info=True)
-            return {}
+            server.starttls()
+            server.login(self.sender_email, self.sender_password)
+        except BaseException:
+            server.close()
+            raise
+        self._smtp = server
+        return server
+    
+    def close(self):
+        """Close the cached SMTP connection."""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
     
     def send_email(self, recipient, subject, body, html_body=None):
-        """Send an email to the specified recipient."""
+        """Send an email to one recipient, or to a list of recipients in a single message.
+        
+        With several recipients the addresses only go in the SMTP envelope, so
+        no recipient sees the others.
+        """
         try:
+            recipients = [recipient] if isinstance(recipient, str) else list(recipient)
             msg = MIMEMultipart('alternative')
             msg['From'] = self.sender_email
-            msg['To'] = recipient
+            msg['To'] = recipients[0] if len(recipients) == 1 else 'undisclosed-recipients:;'
             msg['Subject'] = subject
             
             # Add plain text version
@@ -43,13 +132,14 @@ class EmailService:
             if html_body:
                 msg.attach(MIMEText(html_body, 'html'))
             
-            # Connect to SMTP server and send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
+            # Send over the cached connection, reconnecting once if the server dropped it
+            try:
+                self._get_conn().send_message(msg, to_addrs=recipients)
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                self._get_conn().send_message(msg, to_addrs=recipients)
             
-            logger.info(f"Email sent successfully to {recipient}")
+            logger.info(f"Email sent successfully to {', '.join(recipients)}")
             return True
         except Exception as e:
             logger.error(f"Error sending email: {str(e)}", exc_info=True)
@@ -58,80 +148,38 @@ class EmailService:
     def send_model_training_notification(self, recipient, model_type, performance_metrics):
         """Send notification about model training completion."""
         subject = f"Model Training Complete - {model_type}"
-        body = f"""
-        Model training has been completed successfully.
-        
-        Model Type: {model_type}
-        Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        Performance Metrics:
-        {json.dumps(performance_metrics, indent=2)}
-        """
-        
-        html_body = f"""
-        <html>
-            <body>
-                <h2>Model Training Complete</h2>
-                <p><strong>Model Type:</strong> {model_type}</p>
-                <p><strong>Timestamp:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <h3>Performance Metrics:</h3>
-                <pre>{json.dumps(performance_metrics, indent=2)}</pre>
-            </body>
-        </html>
-        """
+        values = {
+            'model_type': model_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'metrics': json_utils.dumps(performance_metrics, indent=True).decode('utf-8')
+        }
+        body = _TRAINING_BODY.substitute(values)
+        html_body = _TRAINING_HTML.substitute(values)
         
         return self.send_email(recipient, subject, body, html_body)
     
     def send_model_drift_alert(self, recipient, model_type, drift_metrics):
         """Send alert about model drift detection."""
         subject = f"Model Drift Alert - {model_type}"
-        body = f"""
-        Model drift has been detected.
-        
-        Model Type: {model_type}
-        Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        Drift Metrics:
-        {json.dumps(drift_metrics, indent=2)}
-        """
-        
-        html_body = f"""
-        <html>
-            <body>
-                <h2 style="color: red;">Model Drift Alert</h2>
-                <p><strong>Model Type:</strong> {model_type}</p>
-                <p><strong>Timestamp:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <h3>Drift Metrics:</h3>
-                <pre>{json.dumps(drift_metrics, indent=2)}</pre>
-            </body>
-        </html>
-        """
+        values = {
+            'model_type': model_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'metrics': json_utils.dumps(drift_metrics, indent=True).decode('utf-8')
+        }
+        body = _DRIFT_BODY.substitute(values)
+        html_body = _DRIFT_HTML.substitute(values)
         
         return self.send_email(recipient, subject, body, html_body)
     
     def send_system_alert(self, recipient, alert_type, message):
         """Send system alert email."""
         subject = f"System Alert - {alert_type}"
-        body = f"""
-        System Alert
-        
-        Type: {alert_type}
-        Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        Message:
-        {message}
-        """
-        
-        html_body = f"""
-        <html>
-            <body>
-                <h2 style="color: orange;">System Alert</h2>
-                <p><strong>Type:</strong> {alert_type}</p>
-                <p><strong>Timestamp:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <h3>Message:</h3>
-                <p>{message}</p>
-            </body>
-        </html>
-        """
+        values = {
+            'alert_type': alert_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'message': message
+        }
+        body = _SYSTEM_BODY.substitute(values)
+        html_body = _SYSTEM_HTML.substitute(values)
         
-        return self.send_email(recipient, subject, body, html_body) 
\ No newline at end of file
+        return self.send_email(recipient, subject, body, html_body)
\ No newline at end of file
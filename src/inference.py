@@ -0,0 +1,27 @@
+"""NumPy-only inference helpers used by the API's hot path."""
+import numpy as np
+
+def fuse_projection(scaler, pca):
+    """Fold StandardScaler and PCA into one affine map X @ W.T + b."""
+    W = pca.components_ / scaler.scale_[None, :]
+    b = -(W @ scaler.mean_) - pca.components_ @ pca.mean_
+    if pca.whiten:
+        std = np.sqrt(pca.explained_variance_)
+        W = W / std[:, None]
+        b = b / std
+    # float32 halves the bytes moved through the projection matmul
+    return (
+        np.ascontiguousarray(W, dtype=np.float32),
+        np.ascontiguousarray(b, dtype=np.float32)
+    )
+
+def centroid_table(cluster_centers):
+    """Return float32 centroids and their squared norms for nearest_centroid()."""
+    centers = np.ascontiguousarray(cluster_centers, dtype=np.float32)
+    return centers, (centers * centers).sum(axis=1)
+
+def nearest_centroid(X, centers, center_norms):
+    """Index of the nearest centroid for each row of X."""
+    # ||x-c||^2 = ||x||^2 - 2x.c + ||c||^2, dropping ||x||^2 which is constant per row
+    scores = center_norms - 2.0 * (X @ centers.T)
+    return scores.argmin(axis=1)
@@ -0,0 +1,28 @@
+"""JSON helpers backed by orjson, falling back to the standard library."""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """Convert NumPy scalars and arrays for the stdlib encoder."""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj, indent=False):
+    """Serialize an object to JSON bytes, optionally with two-space indentation."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, default=_default).encode('utf-8')
@@ -1,8 +1,32 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import time
 from datetime import datetime
 from pathlib import Path
 
+# Thread, process and multiprocessing names are never formatted, so skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that formats the timestamp once per second instead of per record."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_time = ''
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_time = time.strftime('%Y-%m-%d %H:%M:%S', self.converter(second))
+        return '%s,%03d' % (self._last_time, record.msecs)
+
 def setup_logging(log_dir='logs'):
     """
     Set up logging configuration for the ML process.
@@ -21,7 +45,9 @@ def setup_logging(log_dir='logs'):
     # File handler for all logs
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     all_log_file = Path(log_dir) / f'ml_process_{timestamp}.log'
-    file_handler = logging.FileHandler(all_log_file)
+    file_handler = logging.handlers.RotatingFileHandler(
+        all_log_file, maxBytes=10 * 1024 * 1024, backupCount=5
+    )
     file_handler.setLevel(logging.DEBUG)
     
     # Console handler for INFO and above
@@ -29,7 +55,7 @@ def setup_logging(log_dir='logs'):
     console_handler.setLevel(logging.INFO)
     
     # Create formatters
-    detailed_formatter = logging.Formatter(
+    detailed_formatter = CachedTimeFormatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     simple_formatter = logging.Formatter(
@@ -40,9 +66,14 @@ def setup_logging(log_dir='logs'):
     file_handler.setFormatter(detailed_formatter)
     console_handler.setFormatter(simple_formatter)
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Route records through a queue so file and console I/O happen on a background thread
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
     
     return logger
 
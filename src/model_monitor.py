@@ -3,48 +3,67 @@ import pandas as pd
 from scipy import stats
 from datetime import datetime, timedelta
 import joblib
+import os
+from functools import lru_cache
 from pathlib import Path
 from .logging_config import logger
-from .email_service import EmailService
+
+@lru_cache(maxsize=8)
+def _load_model(path, mtime):
+    """Load a joblib artifact; mtime is part of the cache key so updated files are reloaded."""
+    return joblib.load(path)
+
+def _load_cached(path):
+    """Load a joblib artifact, reusing the cached object while the file is unchanged."""
+    return _load_model(str(path), os.path.getmtime(path))
+
+def _ks_wasserstein(current, reference):
+    """Compute column-wise two-sample KS statistics and Wasserstein distances.
+    
+    Both samples are pooled and sorted once per column; the running
+    difference of the two empirical CDFs gives the KS statistic as its
+    largest magnitude and the Wasserstein distance as its integral.
+    """
+    n1, n2 = len(current), len(reference)
+    values = np.concatenate([current, reference])
+    order = np.argsort(values, axis=0, kind='mergesort')
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    cdf_diff = np.cumsum(np.where(order < n1, 1.0 / n1, -1.0 / n2), axis=0)
+    
+    # Tied values only count once the whole run has been added to both CDFs
+    run_end = np.ones(sorted_values.shape, dtype=bool)
+    run_end[:-1] = sorted_values[1:] != sorted_values[:-1]
+    ks_stats = np.where(run_end, np.abs(cdf_diff), 0.0).max(axis=0)
+    
+    wasserstein_dists = (np.abs(cdf_diff[:-1]) * np.diff(sorted_values, axis=0)).sum(axis=0)
+    return ks_stats, wasserstein_dists
 
 class ModelMonitor:
-    def __init__(self, config_path='config/monitor_config.json'):
-        """Initialize model monitor with configuration."""
-        self.config = self._load_config(config_path)
-        self.email_service = EmailService()
+    def __init__(self, config, email_service):
+        """Initialize model monitor with an already-loaded configuration."""
+        self.config = config
+        self.email_service = email_service
         self.drift_threshold = self.config.get('drift_threshold', 0.05)
-        self.alert_recipients = self.config.get('alert_recipients', [])
-        
-    def _load_config(self, config_path):
-        """Load monitoring configuration from file."""
-        try:
-            config_file = Path(config_path)
-            if not config_file.exists():
-                logger.warning(f"Monitor config file not found: {config_path}")
-                return {}
-            with open(config_file) as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading monitor config: {str(e)}", exc_info=True)
-            return {}
+        self.alert_recipients = [r for r in self.config.get('alert_recipients', []) if r]
     
     def detect_data_drift(self, current_data, reference_data, features):
         """Detect data drift between current and reference data."""
-        drift_metrics = {}
+        features = list(features)
+        current = np.ascontiguousarray(current_data[features], dtype=np.float64)
+        reference = np.ascontiguousarray(reference_data[features], dtype=np.float64)
         
-        for feature in features:
-            # Calculate Kolmogorov-Smirnov test statistic
-            ks_stat, p_value = stats.ks_2samp(
-                current_data[feature],
-                reference_data[feature]
-            )
-            
-            # Calculate Wasserstein distance
-            wasserstein_dist = stats.wasserstein_distance(
-                current_data[feature],
-                reference_data[feature]
-            )
-            
+        # Kolmogorov-Smirnov statistics and Wasserstein distances for all features at once
+        ks_stats, wasserstein_dists = _ks_wasserstein(current, reference)
+        
+        # Asymptotic two-sided KS p-values
+        n1, n2 = len(current), len(reference)
+        effective_n = max(1, round(n1 * n2 / (n1 + n2)))
+        p_values = np.clip(stats.kstwo.sf(ks_stats, effective_n), 0.0, 1.0)
+        
+        drift_metrics = {}
+        for feature, ks_stat, p_value, wasserstein_dist in zip(
+            features, ks_stats.tolist(), p_values.tolist(), wasserstein_dists.tolist()
+        ):
             drift_metrics[feature] = {
                 'ks_statistic': ks_stat,
                 'p_value': p_value,
@@ -62,16 +81,15 @@ class ModelMonitor:
         accuracy_diff = np.mean(current_predictions == reference_predictions)
         performance_metrics['accuracy'] = accuracy_diff
         
-        # Calculate distribution metrics
-        current_dist = np.bincount(current_predictions)
-        reference_dist = np.bincount(reference_predictions)
-        
-        # Normalize distributions
-        current_dist = current_dist / np.sum(current_dist)
-        reference_dist = reference_dist / np.sum(reference_dist)
+        # Calculate normalized cluster distributions over a shared set of bins,
+        # shifting labels so DBSCAN noise (-1) maps to a valid bin
+        offset = min(current_predictions.min(), reference_predictions.min())
+        n_bins = max(current_predictions.max(), reference_predictions.max()) - offset + 1
+        current_dist = np.bincount(current_predictions - offset, minlength=n_bins) / current_predictions.size
+        reference_dist = np.bincount(reference_predictions - offset, minlength=n_bins) / reference_predictions.size
         
         # Calculate distribution difference
-        distribution_diff = np.sum(np.abs(current_dist - reference_dist))
+        distribution_diff = float(np.abs(current_dist - reference_dist).sum())
         performance_metrics['distribution_difference'] = distribution_diff
         
         return performance_metrics
@@ -80,27 +98,30 @@ class ModelMonitor:
         """Check overall model health and send alerts if needed."""
         try:
             # Load models
-            models_dir = Path("models")
-            model = joblib.load(models_dir / f'{model_type.lower()}.joblib')
-            scaler = joblib.load(models_dir / 'scaler.joblib')
-            pca = joblib.load(models_dir / 'pca.joblib')
+            models = _load_cached(Path("models") / 'models.joblib')
+            model = models[model_type.lower()]
+            scaler = models['scaler']
+            pca = models['pca']
+            # The scaler was fitted on a bare array, so select the training columns in order
+            features = models['features']
             
             # Preprocess data
-            current_scaled = scaler.transform(current_data)
+            current_scaled = scaler.transform(current_data[features].to_numpy())
             current_pca = pca.transform(current_scaled)
             
-            reference_scaled = scaler.transform(reference_data)
+            reference_scaled = scaler.transform(reference_data[features].to_numpy())
             reference_pca = pca.transform(reference_scaled)
             
-            # Get predictions
-            current_predictions = model.predict(current_pca)
-            reference_predictions = model.predict(reference_pca)
+            # Get predictions in the dtype the model was fitted in; training uses float32
+            fit_dtype = getattr(model, 'cluster_centers_', current_pca).dtype
+            current_predictions = model.predict(current_pca.astype(fit_dtype, copy=False))
+            reference_predictions = model.predict(reference_pca.astype(fit_dtype, copy=False))
             
             # Detect data drift
             drift_metrics = self.detect_data_drift(
                 current_data,
                 reference_data,
-                current_data.columns
+                features
             )
             
             # Monitor performance
@@ -117,9 +138,9 @@ class ModelMonitor:
             
             if significant_drift:
                 logger.warning(f"Significant drift detected in {model_type} model")
-                for recipient in self.alert_recipients:
+                if self.alert_recipients:
                     self.email_service.send_model_drift_alert(
-                        recipient,
+                        self.alert_recipients,
                         model_type,
                         {
                             'drift_metrics': drift_metrics,
@@ -135,9 +156,9 @@ class ModelMonitor:
             
         except Exception as e:
             logger.error(f"Error checking model health: {str(e)}", exc_info=True)
-            for recipient in self.alert_recipients:
+            if self.alert_recipients:
                 self.email_service.send_system_alert(
-                    recipient,
+                    self.alert_recipients,
                     'Model Health Check Error',
                     str(e)
                 )
@@ -1,20 +1,37 @@
 import os
 import joblib
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import pandas as pd
+
+# Use Intel's oneDAL-backed estimators when available; must run before sklearn imports
+try:
+    from sklearnex import patch_sklearn
+    patch_sklearn()
+except ImportError:
+    pass
+
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.metrics import silhouette_score
+from sklearn.pipeline import make_pipeline
+from sklearn.cluster import MiniBatchKMeans, DBSCAN
 import numpy as np
 from pathlib import Path
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from .customer_segmentation import load_data, preprocess_data
+from .customer_segmentation import (
+    load_data, FEATURES, faiss, HNSWDBSCAN, IVFDBSCAN,
+    centroid_silhouette_score, dbscan_silhouette_score
+)
 from .logging_config import logger
 from .database import Database
 
-def train_models(data_path, output_dir='models', user_id=None):
+# faiss-backed DBSCAN variants selectable through train_models(dbscan_index=...)
+FAISS_DBSCAN = {'ivf': IVFDBSCAN, 'hnsw': HNSWDBSCAN}
+
+def train_models(data_path, output_dir='models', user_id=None, dbscan_index='ivf'):
     """
     Train and save the clustering models.
     
@@ -22,7 +39,11 @@ def train_models(data_path, output_dir='models', user_id=None):
         data_path (str): Path to the input data file
         output_dir (str): Directory to save the trained models
         user_id (int): ID of the user training the models
+        dbscan_index (str): faiss index for DBSCAN neighborhoods ('ivf' or 'hnsw');
+            ignored when faiss is not installed
     """
+    if dbscan_index not in FAISS_DBSCAN:
+        raise ValueError(f"Unknown dbscan_index: {dbscan_index}")
     try:
         logger.info(f"Starting model training process with data from {data_path}")
         
@@ -33,97 +54,115 @@ def train_models(data_path, output_dir='models', user_id=None):
         # Load and preprocess data
         logger.info("Loading and preprocessing data...")
         df = load_data(data_path)
-        X, features = preprocess_data(df)
+        features = list(FEATURES)
+        # Keep PCA, clustering and silhouette inputs in contiguous float32
+        X = df[features].to_numpy(dtype=np.float32)
         logger.info(f"Data loaded successfully. Shape: {df.shape}")
         logger.debug(f"Features used: {features}")
         
-        # Train and save scaler
-        logger.info("Training StandardScaler...")
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(df[features])
-        scaler_path = os.path.join(output_dir, 'scaler.joblib')
-        joblib.dump(scaler, scaler_path)
-        logger.info(f"Scaler saved to {scaler_path}")
-        
-        # Train and save PCA
-        logger.info("Training PCA...")
-        pca = PCA(n_components=2)
-        X_pca = pca.fit_transform(X_scaled)
-        pca_path = os.path.join(output_dir, 'pca.joblib')
-        joblib.dump(pca, pca_path)
-        logger.info(f"PCA saved to {pca_path}")
-        logger.debug(f"Explained variance ratio: {pca.explained_variance_ratio_}")
-        
-        # Train and save K-means
-        logger.info("Training K-means model...")
-        kmeans = KMeans(n_clusters=4, random_state=42)
-        kmeans_labels = kmeans.fit_predict(X_pca)
-        kmeans_path = os.path.join(output_dir, 'kmeans.joblib')
-        joblib.dump(kmeans, kmeans_path)
-        logger.info(f"K-means model saved to {kmeans_path}")
-        
-        # Train and save DBSCAN
-        logger.info("Training DBSCAN model...")
-        dbscan = DBSCAN(eps=0.5, min_samples=5)
-        dbscan_labels = dbscan.fit_predict(X_pca)
-        dbscan_path = os.path.join(output_dir, 'dbscan.joblib')
-        joblib.dump(dbscan, dbscan_path)
-        logger.info(f"DBSCAN model saved to {dbscan_path}")
-        
-        # Save feature names
-        features_path = os.path.join(output_dir, 'features.joblib')
-        joblib.dump(features, features_path)
-        logger.info(f"Feature names saved to {features_path}")
+        # Cap BLAS threads so PCA, the concurrent fits and scoring do not oversubscribe
+        with threadpool_limits(limits=min(os.cpu_count() or 1, 8), user_api='blas'):
+            # Fit the scaler and PCA as one pipeline; the scaler standardizes X in place
+            logger.info("Training scaler and PCA...")
+            pipeline = make_pipeline(
+                StandardScaler(copy=False),
+                PCA(n_components=2, svd_solver='randomized', random_state=42, iterated_power=4)
+            )
+            X_pca = pipeline.fit_transform(X)
+            scaler, pca = pipeline.named_steps['standardscaler'], pipeline.named_steps['pca']
+            # In-place scaling is only safe on our own buffer; callers of the saved scaler keep their input
+            scaler.set_params(copy=True)
+            logger.debug(f"Explained variance ratio: {pca.explained_variance_ratio_}")
+            
+            # Train K-means and DBSCAN concurrently; both release the GIL in their kernels
+            logger.info("Training K-means and DBSCAN models...")
+            kmeans = MiniBatchKMeans(
+                n_clusters=4, batch_size=4096, random_state=42, n_init=3, reassignment_ratio=0.01
+            )
+            if faiss is not None:
+                dbscan = FAISS_DBSCAN[dbscan_index](eps=0.5, min_samples=5)
+            else:
+                dbscan = DBSCAN(eps=0.5, min_samples=5)
+            kmeans_labels, dbscan_labels = Parallel(n_jobs=2, backend='threading')([
+                delayed(kmeans.fit_predict)(X_pca),
+                delayed(dbscan.fit_predict)(X_pca)
+            ])
+            
+            # Write the DBSCAN labels and the compressed model archive in the
+            # background while the metrics are computed; fitted models are not modified
+            dbscan_labels_path = os.path.join(output_dir, 'dbscan_labels.npy')
+            models_path = os.path.join(output_dir, 'models.joblib')
+            io_exec = ThreadPoolExecutor(max_workers=2)
+            pending_writes = [
+                io_exec.submit(np.save, dbscan_labels_path, dbscan_labels),
+                io_exec.submit(joblib.dump, {
+                    'scaler': scaler,
+                    'pca': pca,
+                    'kmeans': kmeans,
+                    'dbscan': dbscan,
+                    'features': features
+                }, models_path, compress=('lz4', 3))
+            ]
+            io_exec.shutdown(wait=False)
+            
+            # Calculate performance metrics
+            logger.info("Calculating model performance metrics...")
+            kmeans_score, dbscan_score = Parallel(n_jobs=2, backend='threading')([
+                delayed(centroid_silhouette_score)(X_pca, kmeans.cluster_centers_),
+                delayed(dbscan_silhouette_score)(X_pca, dbscan_labels)
+            ])
         
-        # Calculate performance metrics
-        logger.info("Calculating model performance metrics...")
-        kmeans_score = silhouette_score(X_pca, kmeans_labels)
-        dbscan_score = silhouette_score(X_pca, dbscan_labels)
+        # Surface any write error before reporting success
+        for future in pending_writes:
+            future.result()
+        logger.info(f"DBSCAN labels saved to {dbscan_labels_path}")
+        logger.info(f"Models saved to {models_path}")
         
-        logger.info(f"K-means Silhouette Score: {kmeans_score:.4f}")
+        logger.info(f"K-means Simplified Silhouette Score: {kmeans_score:.4f}")
         logger.info(f"DBSCAN Silhouette Score: {dbscan_score:.4f}")
         
         # Save model versions to database if user_id is provided
         if user_id:
             db = Database()
             try:
-                # Save K-means model version
-                kmeans_version = f"kmeans_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                kmeans_metrics = json.dumps({
-                    'silhouette_score': float(kmeans_score),
-                    'n_clusters': 4,
-                    'features': features
-                })
-                kmeans_model_id = db.save_model_version(
-                    kmeans_version, 'kmeans', kmeans_metrics, user_id
-                )
-                
-                # Save DBSCAN model version
-                dbscan_version = f"dbscan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                dbscan_metrics = json.dumps({
-                    'silhouette_score': float(dbscan_score),
-                    'eps': 0.5,
-                    'min_samples': 5,
-                    'features': features
-                })
-                dbscan_model_id = db.save_model_version(
-                    dbscan_version, 'dbscan', dbscan_metrics, user_id
-                )
-                
-                # Save customer segments
-                kmeans_segments = pd.DataFrame({
-                    'customer_id': df.index,
-                    'segment_id': kmeans_labels,
-                    'confidence_score': None  # Add confidence scores if available
-                })
-                db.save_customer_segments(kmeans_segments, kmeans_model_id)
+                # One timestamp so both model versions share the same suffix
+                version_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+                # K-means is scored with the centroid (simplified) silhouette, DBSCAN exactly;
+                # silhouette_method tells consumers which of the two they are reading
+                # Encode the shared feature list once and embed it in both metrics payloads
+                features_json = json.dumps(features, separators=(',', ':'))
                 
-                dbscan_segments = pd.DataFrame({
-                    'customer_id': df.index,
-                    'segment_id': dbscan_labels,
-                    'confidence_score': None
-                })
-                db.save_customer_segments(dbscan_segments, dbscan_model_id)
+                # Write model versions and segments in one transaction
+                with db.transaction():
+                    # Save K-means model version
+                    kmeans_version = f"kmeans_{version_ts}"
+                    kmeans_metrics = '{"silhouette_score":%s,"silhouette_method":"simplified","n_clusters":4,"features":%s}' % (
+                        json.dumps(float(kmeans_score)), features_json
+                    )
+                    kmeans_model_id = db.save_model_version(
+                        kmeans_version, 'kmeans', kmeans_metrics, user_id
+                    )
+                    
+                    # Save DBSCAN model version
+                    dbscan_version = f"dbscan_{version_ts}"
+                    dbscan_metrics = '{"silhouette_score":%s,"silhouette_method":"exact","eps":0.5,"min_samples":5,"features":%s}' % (
+                        json.dumps(float(dbscan_score)), features_json
+                    )
+                    dbscan_model_id = db.save_model_version(
+                        dbscan_version, 'dbscan', dbscan_metrics, user_id
+                    )
+                    
+                    # Save customer segments; the DBSCAN frame reuses the id and score columns
+                    segments = pd.DataFrame({
+                        'customer_id': df.index.to_numpy(),
+                        'segment_id': kmeans_labels.astype(np.int32),
+                        # Add confidence scores if available
+                        'confidence_score': np.full(len(df), np.nan, dtype=np.float32)
+                    })
+                    db.save_customer_segments(segments, kmeans_model_id)
+                    
+                    segments['segment_id'] = dbscan_labels.astype(np.int32)
+                    db.save_customer_segments(segments, dbscan_model_id)
                 
                 db.close()
             except Exception as e:
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import silhouette_score
+
+from src.customer_segmentation import (
+    silhouette_batched, dbscan_silhouette_score, perform_dbscan, IVFDBSCAN, HNSWDBSCAN
+)
+
+
+def _blobs(n_per_blob=800, spread=0.4, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = [(0, 0), (3, 0), (0, 4)]
+    return np.vstack([rng.normal(c, spread, (n_per_blob, 2)) for c in centers]).astype(np.float32)
+
+
+def test_silhouette_batched_matches_sklearn():
+    X = _blobs()
+    labels = np.random.default_rng(1).integers(-1, 3, len(X))
+    labels[0] = 7  # singleton cluster scores 0
+    expected = silhouette_score(X, labels)
+    assert silhouette_batched(X, labels, batch_size=333) == pytest.approx(expected, rel=1e-6)
+
+
+def test_silhouette_batched_rejects_single_label():
+    X = _blobs(n_per_blob=10)
+    with pytest.raises(ValueError):
+        silhouette_batched(X, np.zeros(len(X), dtype=int))
+
+
+def test_dbscan_silhouette_ignores_noise():
+    X = _blobs()
+    labels = DBSCAN(eps=0.3, min_samples=5).fit_predict(X)
+    clustered = labels != -1
+    expected = silhouette_score(X[clustered], labels[clustered])
+    assert dbscan_silhouette_score(X, labels) == pytest.approx(expected, rel=1e-6)
+    assert np.isnan(dbscan_silhouette_score(X, np.full(len(X), -1)))
+
+
+@pytest.mark.parametrize("fit_predict", [
+    lambda X: perform_dbscan(X, eps=0.3, min_samples=5, use_faiss=True)[0],
+    lambda X: IVFDBSCAN(eps=0.3, min_samples=5).fit_predict(X),
+    lambda X: HNSWDBSCAN(eps=0.3, min_samples=5).fit_predict(X),
+], ids=["knn-graph", "ivf", "hnsw"])
+def test_faiss_dbscan_matches_exact(fit_predict):
+    pytest.importorskip("faiss")
+    X = _blobs()
+    expected = DBSCAN(eps=0.3, min_samples=5).fit_predict(X)
+    np.testing.assert_array_equal(fit_predict(X), expected)
+
+
+def test_ivf_dbscan_clusters_small_inputs():
+    pytest.importorskip("faiss")
+    X = np.array([[0.0, 0.0], [0.1, 0.0], [0.0, 0.1], [0.1, 0.1], [0.05, 0.05]], dtype=np.float32)
+    np.testing.assert_array_equal(IVFDBSCAN(eps=0.5, min_samples=5).fit_predict(X), np.zeros(5))
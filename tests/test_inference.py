@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+from src.inference import fuse_projection, centroid_table, nearest_centroid
+
+
+@pytest.fixture
+def customers():
+    """Raw feature rows on the dataset's scales (income in the tens of thousands)."""
+    rng = np.random.default_rng(0)
+    scales = np.array([5e4, 50, 300, 25, 160, 35, 25, 45, 2, 4, 3, 6, 5])
+    return rng.gamma(2.0, 1.0, (2000, len(scales))) * scales
+
+
+@pytest.mark.parametrize("whiten", [False, True])
+def test_fused_projection_matches_chained_transform(customers, whiten):
+    scaler = StandardScaler().fit(customers)
+    pca = PCA(n_components=2, whiten=whiten, random_state=42).fit(scaler.transform(customers))
+    W, b = fuse_projection(scaler, pca)
+
+    fused = customers.astype(np.float32) @ W.T + b
+    chained = pca.transform(scaler.transform(customers))
+    np.testing.assert_allclose(fused, chained, rtol=1e-4, atol=1e-4)
+
+
+def test_nearest_centroid_matches_kmeans_predict(customers):
+    scaler = StandardScaler().fit(customers)
+    pca = PCA(n_components=2, random_state=42).fit(scaler.transform(customers))
+    X_pca = pca.transform(scaler.transform(customers)).astype(np.float32)
+    kmeans = MiniBatchKMeans(n_clusters=4, n_init=3, random_state=42).fit(X_pca)
+
+    centers, center_norms = centroid_table(kmeans.cluster_centers_)
+    np.testing.assert_array_equal(nearest_centroid(X_pca, centers, center_norms), kmeans.predict(X_pca))
@@ -0,0 +1,18 @@
+import numpy as np
+from scipy import stats
+
+from src.model_monitor import _ks_wasserstein
+
+
+def test_ks_wasserstein_matches_scipy():
+    rng = np.random.default_rng(0)
+    # Integer-valued columns exercise tied values across both samples
+    current = np.column_stack([rng.normal(0, 1, 300), rng.integers(0, 10, 300)]).astype(float)
+    reference = np.column_stack([rng.normal(0.3, 1.2, 500), rng.integers(2, 12, 500)]).astype(float)
+
+    ks_stats, wasserstein_dists = _ks_wasserstein(current, reference)
+    for col in range(current.shape[1]):
+        expected_ks = stats.ks_2samp(current[:, col], reference[:, col]).statistic
+        expected_w = stats.wasserstein_distance(current[:, col], reference[:, col])
+        np.testing.assert_allclose(ks_stats[col], expected_ks, rtol=1e-12)
+        np.testing.assert_allclose(wasserstein_dists[col], expected_w, rtol=1e-9)